@@ -1,9 +1,125 @@
 import argparse
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 from asciimatics.screen import Screen
 import logging
+import hashlib
+import os
+import tempfile
+from numba import njit
+
+# Versión del formato de la caché de pesos; debe incrementarse cada vez que cambie
+# la forma de entrenar la red, para que no se reutilicen pesos calculados con otra versión
+CACHE_VERSION = 1
+
+@njit(cache=True, fastmath=True)
+def _recall_kernel(weights, pattern, max_iter):
+    """
+    Núcleo compilado con Numba para la recuperación asíncrona de un patrón.
+    Cada neurona se actualiza en orden usando el estado más reciente de las demás,
+    lo que garantiza que la energía de la red no aumente en ninguna actualización.
+
+    Args:
+        weights (numpy.ndarray): Matriz de pesos sinápticos de la red
+        pattern (numpy.ndarray): Patrón a actualizar (se modifica en el lugar)
+        max_iter (int): Número máximo de iteraciones para la convergencia
+
+    Returns:
+        numpy.ndarray: Patrón recuperado
+    """
+    n = pattern.shape[0]
+    for _ in range(max_iter):
+        changed = False
+        for i in range(n):
+            s = 0.0
+            for j in range(n):
+                s += weights[i, j] * pattern[j]
+            # Umbral sin saltos: (s >= 0) vale 0 o 1, y se lleva a -1 o 1
+            ns = 2 * (s >= 0) - 1
+            changed |= ns != pattern[i]
+            pattern[i] = ns
+        # Verifica si el patrón se ha estabilizado
+        if not changed:
+            break
+    return pattern
+
+def pack_bits(patterns):
+    """
+    Empaqueta patrones bipolares (-1/1) en palabras de 64 bits.
+    El bit j de la palabra j // 64 vale 1 si la neurona j está activa (1) y 0 en caso contrario.
+
+    Args:
+        patterns (numpy.ndarray): Patrón o matriz donde cada fila es un patrón
+
+    Returns:
+        numpy.ndarray: Palabras np.uint64 con los bits de cada patrón
+    """
+    bits = np.asarray(patterns) > 0
+    pad = -bits.shape[-1] % 64
+    if pad:
+        bits = np.pad(bits, [(0, 0)] * (bits.ndim - 1) + [(0, pad)])
+    return np.packbits(bits, axis=-1, bitorder='little').view('<u8')
+
+def unpack_bits(words, size):
+    """
+    Operación inversa de pack_bits.
+
+    Args:
+        words (numpy.ndarray): Palabras np.uint64 con los bits de cada patrón
+        size (int): Número de neuronas de cada patrón
+
+    Returns:
+        numpy.ndarray: Patrón o matriz de patrones bipolares (int8)
+    """
+    bits = np.unpackbits(words.view(np.uint8), axis=-1, bitorder='little')[..., :size]
+    return (2 * bits.astype(np.int8) - 1)
+
+@njit(cache=True)
+def _popcount64(x):
+    """
+    Cuenta los bits activos de una palabra de 64 bits con la técnica SWAR.
+    """
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+@njit(cache=True)
+def _recall_bits_kernel(weight_bits, weight_mask, p_bits, n, max_iter):
+    """
+    Núcleo compilado con Numba para la recuperación asíncrona sobre patrones empaquetados.
+    Solo se usa el signo de los pesos: el producto de una fila por el patrón es el número
+    de bits que coinciden menos el número de bits que difieren, restringido a los pesos no nulos.
+
+    Args:
+        weight_bits (numpy.ndarray): Signo de cada fila de pesos empaquetado con pack_bits
+        weight_mask (numpy.ndarray): Máscara empaquetada de los pesos distintos de cero
+        p_bits (numpy.ndarray): Patrón empaquetado (se modifica en el lugar)
+        n (int): Número de neuronas en la red
+        max_iter (int): Número máximo de iteraciones para la convergencia
+
+    Returns:
+        numpy.ndarray: Patrón recuperado, empaquetado
+    """
+    n_words = p_bits.shape[0]
+    for _ in range(max_iter):
+        changed = False
+        for i in range(n):
+            h = 0
+            for k in range(n_words):
+                x = weight_bits[i, k] ^ p_bits[k]
+                m = weight_mask[i, k]
+                h += np.int64(_popcount64(m & ~x)) - np.int64(_popcount64(m & x))
+            word = i >> 6
+            bit = np.uint64(1) << np.uint64(i & 63)
+            old = (p_bits[word] & bit) != 0
+            flip = (h >= 0) != old
+            changed |= flip
+            p_bits[word] ^= bit * np.uint64(flip)
+        # Verifica si el patrón se ha estabilizado
+        if not changed:
+            break
+    return p_bits
 
 class HopfieldNetwork:
     """
@@ -12,7 +128,7 @@ class HopfieldNetwork:
     
     Attributes:
         size (int): Tamaño de los patrones de entrada (número de neuronas en la red)
-        weights (numpy.ndarray): Matriz de pesos sinápticos de la red
+        weights (numpy.ndarray): Matriz de pesos sinápticos de la red (float32)
     """
     
     def __init__(self, size):
@@ -23,34 +139,85 @@ class HopfieldNetwork:
             size (int): Número de neuronas en la red
         """
         self.size = size
-        self.weights = np.zeros((size, size))
+        self.weights = np.zeros((size, size), dtype=np.float32)
+        self._packed_weights_cache = None
     
     def train(self, patterns):
         """
         Entrena la red con un conjunto de patrones usando la regla de Hebbian.
         La regla de Hebbian establece que "las neuronas que se activan juntas, se conectan más fuertemente".
-        En esta implementación, se utiliza el producto exterior para ajustar los pesos sinápticos de la red.
+        En esta implementación, la suma de los productos exteriores de todos los patrones se calcula
+        de una vez como el producto matricial patterns.T @ patterns.
 
         Args:
             patterns (numpy.ndarray): Matriz donde cada fila es un patrón de entrenamiento
         """
-        try:
-            for pattern in patterns:
-                # Calcula el producto exterior para cada patrón
-                self.weights += np.outer(pattern, pattern)
-            # Elimina las autoconexiones
-            np.fill_diagonal(self.weights, 0)
-            # Normaliza los pesos por el número de patrones
-            self.weights /= len(patterns)
-        except Exception as e:
-            logging.error(f"Error durante el entrenamiento: {e}")
-            raise e
+        if np.ndim(patterns) != 2 or np.shape(patterns)[1] != self.size:
+            raise ValueError(f"Los patrones tienen forma {np.shape(patterns)}, se esperaba (P, {self.size})")
+        # Suma los productos exteriores de todos los patrones en una sola operación
+        P = patterns.astype(np.float32)
+        self.weights = P.T @ P
+        # Elimina las autoconexiones
+        np.fill_diagonal(self.weights, 0)
+        # Normaliza los pesos por el número de patrones
+        self.weights /= len(patterns)
+        self._packed_weights_cache = None
+
+    def _packed_weights(self):
+        """
+        Devuelve el signo de los pesos empaquetado en bits junto con la máscara de los pesos
+        distintos de cero, para la recuperación con bits. Se calculan en la primera llamada
+        y se reutilizan hasta que los pesos cambian.
+
+        Returns:
+            tuple: Signo de cada fila de pesos y máscara de pesos no nulos, empaquetados con pack_bits
+        """
+        if self._packed_weights_cache is None:
+            weight_sign = np.sign(self.weights)
+            self._packed_weights_cache = (pack_bits(weight_sign), pack_bits(weight_sign != 0))
+        return self._packed_weights_cache
     
+    def save_weights(self, path):
+        """
+        Guarda la matriz de pesos en un archivo .npy.
+
+        Args:
+            path (str): Ruta del archivo de destino
+        """
+        save_array_atomic(path, self.weights)
+
+    def load_weights(self, path):
+        """
+        Carga una matriz de pesos guardada con save_weights, mapeándola en memoria
+        en modo de solo lectura para evitar reentrenar la red.
+
+        Args:
+            path (str): Ruta del archivo .npy con los pesos
+        """
+        weights = np.load(path, mmap_mode='r')
+        if weights.shape != (self.size, self.size):
+            raise ValueError(f"Los pesos de {path} tienen forma {weights.shape}, se esperaba ({self.size}, {self.size})")
+        self.weights = weights
+        self._packed_weights_cache = None
+
+    def _check_pattern(self, pattern):
+        """
+        Verifica que el patrón tenga una neurona por cada neurona de la red.
+        Los núcleos compilados no comprueban los límites de los arreglos, por lo que
+        un patrón de otro tamaño debe rechazarse antes de llamarlos.
+
+        Args:
+            pattern (numpy.ndarray): Patrón a verificar
+        """
+        if np.shape(pattern) != (self.size,):
+            raise ValueError(f"El patrón tiene forma {np.shape(pattern)}, se esperaba ({self.size},)")
+
     def recall(self, pattern, max_iter=10):
         """
         Recupera un patrón almacenado a partir de un patrón de entrada.
         El proceso de recuperación sigue iterando hasta que el patrón se estabiliza, es decir,
         no cambia en una iteración completa.
+        La actualización es asíncrona y se ejecuta en un núcleo compilado con Numba.
 
         Args:
             pattern (numpy.ndarray): Patrón de entrada a recuperar
@@ -59,41 +226,89 @@ class HopfieldNetwork:
         Returns:
             numpy.ndarray: Patrón recuperado
         """
-        try:
-            pattern = pattern.copy()
-            for _ in range(max_iter):
-                previous_pattern = pattern.copy()
-                for i in range(self.size):
-                    # Actualiza cada neurona según la regla de activación
-                    pattern[i] = 1 if np.dot(self.weights[i], pattern) >= 0 else -1
-                # Verifica si el patrón se ha estabilizado
-                if np.array_equal(pattern, previous_pattern):
-                    break
-            return pattern
-        except Exception as e:
-            logging.error(f"Error durante la recuperación: {e}")
-            raise e
+        self._check_pattern(pattern)
+        # Única copia del patrón: el núcleo lo actualiza en el lugar y detecta
+        # la convergencia con un indicador de cambios, sin copias por iteración
+        pattern = pattern.astype(np.int8)
+        return _recall_kernel(self.weights, pattern, max_iter)
     
-    def add_noise(self, pattern, noise_level=0.3):
+    def recall_bits(self, pattern, max_iter=10, packed=False):
+        """
+        Recupera un patrón almacenado usando solo el signo de los pesos.
+        Los patrones y las filas de pesos se empaquetan en palabras de 64 bits, de modo que
+        cada producto escalar se reduce a operaciones XOR y conteos de bits.
+
+        Args:
+            pattern (numpy.ndarray): Patrón de entrada a recuperar
+            max_iter (int): Número máximo de iteraciones para la convergencia
+            packed (bool): Si es True, el patrón de entrada y el resultado son palabras
+                empaquetadas con pack_bits, lo que evita empaquetar y desempaquetar en cada llamada
+
+        Returns:
+            numpy.ndarray: Patrón recuperado
+        """
+        if packed:
+            n_words = -(-self.size // 64)
+            if np.shape(pattern) != (n_words,) or pattern.dtype != np.uint64:
+                raise ValueError(f"El patrón empaquetado debe tener forma ({n_words},) y tipo uint64")
+            weight_bits, weight_mask = self._packed_weights()
+            return _recall_bits_kernel(weight_bits, weight_mask, pattern.copy(), self.size, max_iter)
+        self._check_pattern(pattern)
+        weight_bits, weight_mask = self._packed_weights()
+        p_bits = pack_bits(pattern)
+        p_bits = _recall_bits_kernel(weight_bits, weight_mask, p_bits, self.size, max_iter)
+        return unpack_bits(p_bits, self.size)
+
+    def recall_batch(self, patterns_matrix, max_iter=10):
+        """
+        Recupera varios patrones a la vez con actualizaciones síncronas.
+        Todas las neuronas de todos los patrones se actualizan en cada iteración con un único
+        producto matricial, hasta que ningún patrón cambia.
+
+        Args:
+            patterns_matrix (numpy.ndarray): Matriz (size, B) donde cada columna es un patrón de entrada
+            max_iter (int): Número máximo de iteraciones para la convergencia
+
+        Returns:
+            numpy.ndarray: Matriz (size, B) con los patrones recuperados
+        """
+        patterns_matrix = patterns_matrix.astype(np.int8)
+        for _ in range(max_iter):
+            # Actualiza todas las neuronas de todos los patrones a la vez
+            H = self.weights @ patterns_matrix.astype(np.float32)
+            new = np.where(H >= 0, np.int8(1), np.int8(-1))
+            # Verifica si los patrones se han estabilizado
+            if np.array_equal(new, patterns_matrix):
+                break
+            patterns_matrix = new
+        return patterns_matrix
+
+    def add_noise(self, pattern, noise_level=0.3, out=None):
         """
         Añade ruido aleatorio a un patrón.
         
         Args:
             pattern (numpy.ndarray): Patrón original
             noise_level (float): Proporción de bits que serán invertidos (0-1)
+            out (numpy.ndarray): Búfer opcional donde escribir el patrón con ruido, para
+                reutilizarlo entre llamadas en lugar de reservar una copia nueva
         
         Returns:
             numpy.ndarray: Patrón con ruido
         """
-        try:
+        if out is None:
             noisy_pattern = pattern.copy()
-            num_noisy_bits = int(self.size * noise_level)
-            noise_indices = np.random.choice(range(self.size), num_noisy_bits, replace=False)
-            noisy_pattern[noise_indices] *= -1
-            return noisy_pattern
-        except Exception as e:
-            logging.error(f"Error al añadir ruido: {e}")
-            raise e
+        else:
+            if np.shape(out) != np.shape(pattern):
+                raise ValueError(f"El búfer out tiene forma {np.shape(out)}, se esperaba {np.shape(pattern)}")
+            noisy_pattern = out
+            np.copyto(noisy_pattern, pattern)
+        num_noisy_bits = int(self.size * noise_level)
+        # Elige los índices con las claves aleatorias más pequeñas, en tiempo lineal
+        keys = np.random.random(self.size)
+        noise_indices = np.argpartition(keys, num_noisy_bits - 1)[:num_noisy_bits]
+        noisy_pattern[noise_indices] *= -1
+        return noisy_pattern
 
 '''def plot_patterns(original, noisy, recovered, title=""):
     """
@@ -130,8 +345,11 @@ def plot_patterns_ascii(original, noisy, recovered, title=""):
     """
     try:
         # Crear una representación ASCII de los patrones
+        lut = np.array(['_', '#'])
         def to_ascii(pattern):
-            return [''.join(['#' if p == 1 else '_' for p in row]) for row in pattern.reshape(8, 8)]
+            # La vista uint8 de la máscara booleana sirve de índice sin otra copia
+            chars = lut[(pattern.reshape(8, 8) > 0).view(np.uint8)]
+            return [''.join(row) for row in chars]
 
         original_ascii = to_ascii(original)
         noisy_ascii = to_ascii(noisy)
@@ -170,6 +388,30 @@ def test_melody_recognition(network, pattern, melody_name, noise_level):
         logging.error(f"Error durante la prueba de reconocimiento de la melodía: {e}")
         raise e
 
+def test_dataset_recognition(network, patterns, noise_level):
+    """
+    Prueba la recuperación de todas las melodías del dataset con ruido en un solo lote.
+    
+    Args:
+        network (HopfieldNetwork): Red de Hopfield entrenada
+        patterns (numpy.ndarray): Matriz donde cada fila es un patrón de melodía
+        noise_level (float): Nivel de ruido a aplicar
+    
+    Returns:
+        float: Proporción de melodías recuperadas correctamente
+    """
+    try:
+        noisy_patterns = np.empty(patterns.T.shape, dtype=patterns.dtype)
+        for k, pattern in enumerate(patterns):
+            network.add_noise(pattern, noise_level, out=noisy_patterns[:, k])
+        recovered_patterns = network.recall_batch(noisy_patterns)
+        recovered_ratio = np.mean(np.all(recovered_patterns == patterns.T, axis=0))
+        print(f"\nMelodías del dataset recuperadas con ruido {noise_level}: {recovered_ratio:.0%}")
+        return recovered_ratio
+    except Exception as e:
+        logging.error(f"Error durante la prueba de reconocimiento del dataset: {e}")
+        raise e
+
 def compare_patterns(recovered, original, all_patterns):
     """
     Compara el patrón recuperado con el original y todos los patrones conocidos.
@@ -207,31 +449,102 @@ def parse_args():
     parser.add_argument('csv_file', type=str, help="Ruta al archivo CSV de melodías, opciones: 'melodias.csv' y 'melodias_dos.csv'")
     parser.add_argument('--noise_level_1', type=positive_float, default=0.4, help="El nivel de ruido a aplicarle al primer patrón. Es un valor entre 0 y 1")  
     parser.add_argument('--noise_level_2', type=positive_float, default=0.3, help="El nivel de ruido a aplicarle al segundo patrón. Es un valor entre 0 y 1")
+    parser.add_argument('--cache_dir', type=str, default='.hopfield_cache', help="Directorio donde se guardan los pesos entrenados para no reentrenar la red en cada ejecución")
+    parser.add_argument('--noise_level_dataset', type=positive_float, default=0.1, help="El nivel de ruido a aplicarle a todas las melodías del dataset en la prueba por lotes. Es un valor entre 0 y 1")
     return parser.parse_args()
 
 # Carga y preprocesamiento de datos
 def load_data(csv_file):
     try:
-        data = pd.read_csv(csv_file, header=None)
-        data = data.iloc[1:, 1:]  # Elimina la primera fila (cabecera) y la primera columna
-        patterns = data.values.astype(int)  # Convierte el DataFrame a una matriz de numpy
+        with open(csv_file) as f:
+            # La cabecera indica el número de columnas; la primera columna es el nombre de la melodía
+            num_columns = len(f.readline().split(','))
+            patterns = np.loadtxt(f, delimiter=',', usecols=range(1, num_columns), dtype=np.int8, ndmin=2)
         return patterns
     except Exception as e:
         logging.error(f"Error al cargar los datos desde el archivo CSV: {e}")
         raise e
 
+def save_array_atomic(path, array):
+    """
+    Guarda un arreglo en un archivo .npy de forma atómica: se escribe primero en un
+    archivo temporal del mismo directorio y luego se reemplaza el destino, de modo que
+    una ejecución interrumpida nunca deja un archivo truncado.
+
+    Args:
+        path (str): Ruta del archivo de destino
+        array (numpy.ndarray): Arreglo a guardar
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        # mkstemp crea el archivo con permisos 0600; se aplican los permisos habituales según la umask
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_trained_network(csv_file, cache_dir):
+    """
+    Carga los patrones y una red entrenada con ellos, reutilizando la caché si existe.
+    Los pesos son una función pura del archivo CSV, por lo que se guardan en cache_dir
+    identificados por un hash de su contenido y por CACHE_VERSION, y se mapean en memoria en las ejecuciones siguientes.
+    Cualquier error al leer o escribir la caché se registra y se trata como un fallo de caché:
+    la red se entrena a partir del CSV y el programa continúa.
+
+    Args:
+        csv_file (str): Ruta al archivo CSV de melodías
+        cache_dir (str): Directorio donde se guardan los patrones y pesos
+
+    Returns:
+        tuple: Matriz de patrones y red de Hopfield entrenada
+    """
+    try:
+        with open(csv_file, 'rb') as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        patterns_path = os.path.join(cache_dir, f"patterns_v{CACHE_VERSION}_{digest}.npy")
+        weights_path = os.path.join(cache_dir, f"weights_v{CACHE_VERSION}_{digest}.npy")
+
+        if os.path.exists(patterns_path) and os.path.exists(weights_path):
+            try:
+                patterns = np.load(patterns_path)
+                if patterns.ndim != 2:
+                    raise ValueError(f"Los patrones de {patterns_path} tienen forma {patterns.shape}")
+                hopfield_net = HopfieldNetwork(size=patterns.shape[1])
+                hopfield_net.load_weights(weights_path)
+                return patterns, hopfield_net
+            except Exception as e:
+                logging.warning(f"No se pudo usar la caché en {cache_dir}, se reentrena la red: {e}")
+
+        patterns = load_data(csv_file)
+        hopfield_net = HopfieldNetwork(size=patterns.shape[1])
+        hopfield_net.train(patterns)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            save_array_atomic(patterns_path, patterns)
+            hopfield_net.save_weights(weights_path)
+        except Exception as e:
+            logging.warning(f"No se pudo guardar la caché en {cache_dir}: {e}")
+        return patterns, hopfield_net
+    except Exception as e:
+        logging.error(f"Error al cargar la red entrenada: {e}")
+        raise e
+
 def main():
     # Configurar el logging
-    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 
     try:
         # Obtener el nombre del archivo CSV y el nivel de ruido desde los argumentos de la línea de comandos
         args = parse_args()
-        patterns = load_data(args.csv_file)
 
-        # Inicialización y entrenamiento de la red
-        hopfield_net = HopfieldNetwork(size=patterns.shape[1])
-        hopfield_net.train(patterns)
+        # Inicialización y entrenamiento de la red (o carga desde la caché)
+        patterns, hopfield_net = load_trained_network(args.csv_file, args.cache_dir)
         print("Red de Hopfield entrenada exitosamente.")
 
         # Ejemplo de uso
@@ -246,6 +559,9 @@ def main():
         recovered_pattern_2 = test_melody_recognition(hopfield_net, patterns[25], 
                                                      "Melodía 2", noise_level=args.noise_level_2)
         compare_patterns(recovered_pattern_2, patterns[25], patterns)
+
+        # Prueba por lotes con todas las melodías del dataset
+        test_dataset_recognition(hopfield_net, patterns, noise_level=args.noise_level_dataset)
         print("Pruebas de reconocimiento completadas")
     except Exception as e:
         logging.critical(f"Ocurrió un error crítico: {e}")